@@ -18,11 +18,19 @@ Run:
 import os
 import json
 import re
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from pathlib import Path
+from functools import lru_cache
 import streamlit as st
 from dotenv import load_dotenv
-from openai import AzureOpenAI
 
-load_dotenv()
+# .env는 프로세스당 한 번만 읽음 (재실행마다 다시 파싱하지 않도록)
+if not os.environ.get("_ENV_LOADED"):
+    load_dotenv()
+    os.environ["_ENV_LOADED"] = "1"
 
 # 페이지 설정
 st.set_page_config(
@@ -32,116 +40,13 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# 축구 테마 CSS 스타일
-st.markdown("""
-    <style>
-    /* 메인 컨테이너 스타일 */
-    .main {
-        background: linear-gradient(135deg, #1e3c72 0%, #2a5298 100%);
-    }
-    
-    /* 헤더 스타일 */
-    .soccer-header {
-        background: linear-gradient(90deg, #00a859 0%, #00d4aa 100%);
-        padding: 1.5rem;
-        border-radius: 15px;
-        text-align: center;
-        color: white;
-        box-shadow: 0 4px 15px rgba(0, 168, 89, 0.3);
-        margin-bottom: 2rem;
-    }
-    
-    .soccer-header h1 {
-        color: white;
-        margin: 0;
-        font-size: 2.5rem;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-    }
-    
-    /* 사이드바 스타일 */
-    .sidebar .sidebar-content {
-        background: linear-gradient(180deg, #f0f8f5 0%, #ffffff 100%);
-    }
-    
-    /* 버튼 스타일 */
-    .stButton>button {
-        background: linear-gradient(90deg, #00a859 0%, #00d4aa 100%);
-        color: white;
-        border: none;
-        border-radius: 25px;
-        padding: 0.5rem 2rem;
-        font-weight: bold;
-        transition: all 0.3s;
-        box-shadow: 0 4px 10px rgba(0, 168, 89, 0.3);
-    }
-    
-    .stButton>button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 15px rgba(0, 168, 89, 0.5);
-    }
-    
-    /* 입력 필드 스타일 */
-    .stTextInput>div>div>input,
-    .stTextArea>div>div>textarea {
-        border-radius: 10px;
-        border: 2px solid #00a859;
-    }
-    
-    /* 채팅 메시지 스타일 */
-    .user-message {
-        background: linear-gradient(90deg, #00a859 0%, #00d4aa 100%);
-        color: white;
-        padding: 1rem;
-        border-radius: 15px;
-        margin: 0.5rem 0;
-        box-shadow: 0 2px 8px rgba(0, 168, 89, 0.2);
-    }
-    
-    .assistant-message {
-        background: #f0f8f5;
-        padding: 1rem;
-        border-radius: 15px;
-        margin: 0.5rem 0;
-        border-left: 4px solid #00a859;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-    }
-    
-    /* 카드 스타일 */
-    .info-card {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 15px;
-        box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-        margin: 1rem 0;
-        border-top: 4px solid #00a859;
-    }
-    
-    /* 스크롤바 스타일 */
-    .element-container {
-        max-height: 600px;
-        overflow-y: auto;
-    }
-    
-    /* 스크롤바 커스텀 */
-    .element-container::-webkit-scrollbar {
-        width: 8px;
-    }
-    
-    .element-container::-webkit-scrollbar-track {
-        background: #f1f1f1;
-        border-radius: 10px;
-    }
-    
-    .element-container::-webkit-scrollbar-thumb {
-        background: #00a859;
-        border-radius: 10px;
-    }
-    
-    .element-container::-webkit-scrollbar-thumb:hover {
-        background: #00d4aa;
-    }
-    </style>
-""", unsafe_allow_html=True)
+# 축구 테마 CSS 스타일 (style.css를 한 번만 읽어 재실행 간에 재사용)
+@st.cache_data
+def load_css() -> str:
+    """style.css 내용을 읽어 반환합니다."""
+    return (Path(__file__).parent / "style.css").read_text(encoding="utf-8")
+
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
 # 헤더
 st.markdown("""
@@ -160,12 +65,19 @@ if not AZURE_KEY or not AZURE_ENDPOINT:
     st.error("⚠️ 환경변수 `AZURE_OAI_KEY` 또는 `AZURE_OAI_ENDPOINT`가 설정되어 있지 않습니다. .env 파일을 확인하세요.")
     st.stop()
 
-try:
-    client = AzureOpenAI(
+@st.cache_resource
+def get_client():
+    """AzureOpenAI 클라이언트를 생성하고 재실행(rerun) 간에 재사용합니다."""
+    # openai 패키지는 클라이언트가 실제로 필요할 때만 임포트
+    from openai import AzureOpenAI
+    return AzureOpenAI(
         azure_endpoint=AZURE_ENDPOINT,
         api_key=AZURE_KEY,
-        api_version="2024-05-01-preview"
+        api_version="2025-01-01-preview"
     )
+
+try:
+    client = get_client()
 except Exception as e:
     st.error(f"❌ AzureOpenAI 클라이언트 초기화 실패: {e}")
     st.stop()
@@ -177,10 +89,35 @@ SOCCER_KEYWORDS = [
     "월드컵", "챔피언스리그", "라리가", "분데스리가", "세리에A"
 ]
 
+# 축구 키워드 감지 패턴 (키워드별 반복 검색 대신 단일 정규식으로 한 번에 검사)
+_SOCCER_RE = re.compile("|".join(re.escape(k) for k in SOCCER_KEYWORDS))
+
+# 도구 호출 패턴 (모듈 로드 시 한 번만 컴파일)
+_MATCH_RE = re.compile(r"경기 요약[:：]?\s*(.+?)\s+vs\s+(.+)", re.IGNORECASE)
+_PLAYER_RE = re.compile(r"선수 통계[:：]?\s*(.+)", re.IGNORECASE)
+
+# 일반 모드에서 모델에 보내는 최근 대화 메시지 수
+MAX_TURNS = 12
+
+# 세션에 보관하는 최대 대화 메시지 수 (초과 시 오래된 메시지부터 삭제)
+MAX_HISTORY = 200
+
+# 응답 캐시 설정 (temperature가 낮아 결과가 거의 결정적인 요청만 캐시)
+REPLY_CACHE_SIZE = 128
+REPLY_CACHE_TTL = 300
+REPLY_CACHE_MAX_TEMPERATURE = 0.5
+
+# 마크다운 문법으로 쓰이는 문자 (없으면 st.text로 가볍게 렌더링)
+_MD_CHARS = set("`*_#[")
+
+# 스트리밍 조각 묶음 기준: 새 조각이 도착했을 때 마지막 전달 후 경과 시간(초) 또는 누적 글자 수
+STREAM_FLUSH_INTERVAL = 0.05
+STREAM_FLUSH_CHARS = 16
+
 # 도구 함수들
-def get_match_summary(home: str, away: str) -> str:
-    """모의 경기 요약을 JSON 문자열로 반환합니다."""
-    summary = {
+def _match_summary_dict(home: str, away: str) -> dict:
+    """모의 경기 요약을 dict로 반환합니다."""
+    return {
         "home": home,
         "away": away,
         "score": "2-1",
@@ -191,11 +128,10 @@ def get_match_summary(home: str, away: str) -> str:
         ],
         "summary_text": f"{home}이(가) {away}를 상대로 역전승을 거두었습니다. 전반에는 팽팽했으나 후반에 흐름을 바꿨습니다."
     }
-    return json.dumps(summary, ensure_ascii=False)
 
-def get_player_stats(player_name: str) -> str:
-    """모의 선수 통계를 JSON 문자열로 반환합니다."""
-    stats = {
+def _player_stats_dict(player_name: str) -> dict:
+    """모의 선수 통계를 dict로 반환합니다."""
+    return {
         "player": player_name,
         "appearances": 24,
         "goals": 9,
@@ -203,26 +139,133 @@ def get_player_stats(player_name: str) -> str:
         "rating": 7.4,
         "notes": f"{player_name}은(는) 이번 시즌 핵심 공격수로 활약 중입니다."
     }
-    return json.dumps(stats, ensure_ascii=False)
 
-def call_model(messages, temperature=0.5, max_tokens=1000):
-    """모델 호출 함수"""
+# 입력에 따라 바뀌는 값만 채워 넣도록 JSON 골격을 dict 빌더로부터 미리 직렬화해 둠
+_SLOT_RE = re.compile(r"\\u0000(\w+)\\u0000")
+
+def _json_template(build, *slots: str) -> str:
+    """각 인자 자리에 슬롯 표시(NUL로 감싼 이름)를 넣어 dict 빌더의 결과를 한 번 직렬화하고,
+    슬롯을 str.format 필드로 바꾼 골격을 반환합니다."""
+    dumped = json.dumps(build(*(f"\x00{slot}\x00" for slot in slots)), ensure_ascii=False)
+    return _SLOT_RE.sub(r"{\1}", dumped.replace("{", "{{").replace("}", "}}"))
+
+def _fill_json_template(template: str, **values: str) -> str:
+    """골격의 필드를 JSON 이스케이프된 입력 값으로 채웁니다."""
+    return template.format_map(
+        {k: json.dumps(v, ensure_ascii=False)[1:-1] for k, v in values.items()}
+    )
+
+_MATCH_TEMPLATE = _json_template(_match_summary_dict, "home", "away")
+_PLAYER_TEMPLATE = _json_template(_player_stats_dict, "player_name")
+
+@lru_cache(maxsize=512)
+def get_match_summary(home: str, away: str) -> str:
+    """모의 경기 요약을 JSON 문자열로 반환합니다."""
+    return _fill_json_template(_MATCH_TEMPLATE, home=home, away=away)
+
+@lru_cache(maxsize=512)
+def get_player_stats(player_name: str) -> str:
+    """모의 선수 통계를 JSON 문자열로 반환합니다."""
+    return _fill_json_template(_PLAYER_TEMPLATE, player_name=player_name)
+
+def stream_model(messages, temperature=0.5, max_tokens=1000, status=None):
+    """모델 호출 함수 (응답 텍스트를 조각 단위로 yield하는 제너레이터)
+
+    status dict가 주어지면 호출 실패 시 status["failed"]를 True로 설정합니다.
+    """
+    if status is None:
+        status = {}
     if client is None:
-        return "❌ 모델 호출 불가 — Azure 클라이언트 초기화 실패"
+        status["failed"] = True
+        yield "❌ 모델 호출 불가 — Azure 클라이언트 초기화 실패"
+        return
+    pending = ""
+    emitted = False
+    last_flush = time.monotonic()
     try:
         resp = client.chat.completions.create(
             model=DEPLOYMENT,
             messages=messages,
             temperature=temperature,
             max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
         )
-        return resp.choices[0].message.content
+        for chunk in resp:
+            # 콘텐츠 필터 결과나 usage 전용 청크는 choices가 비어 있음
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if not delta:
+                continue
+            pending += delta
+            # 토큰마다 내보내지 않고 묶어서 전달 (새 조각이 올 때만 검사하므로
+            # 스트림이 멈춘 동안에는 남은 텍스트가 다음 조각이나 종료 시점까지 대기)
+            now = time.monotonic()
+            if now - last_flush >= STREAM_FLUSH_INTERVAL or len(pending) >= STREAM_FLUSH_CHARS:
+                yield pending
+                emitted = True
+                pending = ""
+                last_flush = now
     except Exception as e:
-        return f"❌ 모델 호출 중 오류: {e}"
+        status["failed"] = True
+        # 오류 전에 받은 텍스트를 먼저 내보낸 뒤 오류 메시지를 덧붙임
+        if pending:
+            yield pending
+            emitted = True
+        err = f"❌ 모델 호출 중 오류: {e}"
+        pending = f"\n\n{err}" if emitted else err
+    if pending:
+        yield pending
+
+@st.cache_resource
+def get_reply_cache():
+    """세션 간에 공유하는 응답 LRU 캐시와 잠금 객체를 반환합니다."""
+    return OrderedDict(), threading.Lock()
+
+def generate_reply(messages, temperature, max_tokens):
+    """응답을 스트리밍으로 렌더링하고, 같은 요청의 최근 응답이 있으면 재사용합니다."""
+    if temperature > REPLY_CACHE_MAX_TEMPERATURE:
+        return st.write_stream(stream_model(messages, temperature=temperature, max_tokens=max_tokens))
+
+    key = (
+        tuple((m["role"], m.get("name"), m["content"]) for m in messages),
+        temperature,
+        max_tokens,
+    )
+    cache, lock = get_reply_cache()
+    with lock:
+        entry = cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] < REPLY_CACHE_TTL:
+            cache.move_to_end(key)
+            reply = entry[1]
+        else:
+            reply = None
+    if reply is not None:
+        st.markdown(reply)
+        return reply
+
+    status = {"failed": False}
+    reply = st.write_stream(stream_model(messages, temperature=temperature, max_tokens=max_tokens, status=status))
+    # 호출이 실패한 응답은 캐시하지 않음
+    if not status["failed"]:
+        with lock:
+            cache[key] = (time.monotonic(), reply)
+            cache.move_to_end(key)
+            while len(cache) > REPLY_CACHE_SIZE:
+                cache.popitem(last=False)
+    return reply
+
+def render_user_content(content: str):
+    """마크다운 문법이 없는 사용자 메시지는 st.text로, 그 외에는 st.markdown으로 렌더링합니다."""
+    if "\n\n" in content or not _MD_CHARS.isdisjoint(content):
+        st.markdown(content)
+    else:
+        st.text(content)
 
 # 세션 상태 초기화
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = deque(maxlen=MAX_HISTORY)
 
 # 사이드바 설정
 with st.sidebar:
@@ -254,43 +297,51 @@ with st.sidebar:
         t_home = st.text_input("홈 팀", "Manchester United", key="test_home")
         t_away = st.text_input("원정 팀", "Liverpool", key="test_away")
         if st.button("모의 경기 요약 생성", key="test_match"):
-            summary = json.loads(get_match_summary(t_home, t_away))
-            st.json(summary)
+            st.json(_match_summary_dict(t_home, t_away))
     
     with st.expander("선수 통계 테스트", expanded=False):
         p_name = st.text_input("선수 이름", "Son Heung-min", key="test_player")
         if st.button("모의 선수 통계 생성", key="test_stats"):
-            stats = json.loads(get_player_stats(p_name))
-            st.json(stats)
+            st.json(_player_stats_dict(p_name))
     
     st.markdown("---")
     if st.button("🗑️ 대화 기록 삭제", use_container_width=True):
-        st.session_state.messages = []
+        st.session_state.messages.clear()
         st.rerun()
 
 # 메인 채팅 영역
 st.markdown("### 💬 대화")
 
-# 대화 기록 표시
-chat_container = st.container()
-with chat_container:
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
-
-# 사용자 입력
-if prompt := st.chat_input("축구에 대해 물어보세요! 예: '맨유 vs 리버풀 경기 요약해줘' 또는 '선수 통계: 손흥민'"):
-    # 사용자 메시지 표시 및 저장
-    with st.chat_message("user"):
-        st.markdown(prompt)
-    st.session_state.messages.append({"role": "user", "content": prompt})
+@st.fragment
+def chat_panel(mode, temp, max_tokens):
+    """대화 기록과 입력을 처리합니다 (메시지 전송 시 이 영역만 다시 실행)."""
+    # 대화 기록 표시
+    chat_container = st.container()
+    with chat_container:
+        for message in st.session_state.messages:
+            with st.chat_message(message["role"]):
+                if message["role"] == "user":
+                    render_user_content(message["content"])
+                else:
+                    st.markdown(message["content"])
+
+    # 사용자 입력 (프래그먼트 안에서는 자동으로 하단에 고정되지 않으므로 st.bottom에 배치)
+    with st.bottom:
+        prompt = st.chat_input("축구에 대해 물어보세요! 예: '맨유 vs 리버풀 경기 요약해줘' 또는 '선수 통계: 손흥민'")
+    if prompt:
+        # 사용자 메시지 표시 및 저장
+        with st.chat_message("user"):
+            render_user_content(prompt)
+        st.session_state.messages.append({"role": "user", "content": prompt})
     
-    # 축구 의도 감지
-    is_soccer = mode == "Soccer" or (mode == "Auto" and any(k in prompt for k in SOCCER_KEYWORDS))
+        # 축구 의도 감지 (Auto 모드에서만 검사하고, 같은 프롬프트는 결과를 재사용)
+        if mode == "Auto" and st.session_state.get("_last_prompt") != prompt:
+            st.session_state._last_intent = bool(_SOCCER_RE.search(prompt))
+            st.session_state._last_prompt = prompt
+        is_soccer = mode == "Soccer" or (mode == "Auto" and st.session_state._last_intent)
     
-    # 응답 생성
-    with st.chat_message("assistant"):
-        with st.spinner("⚽ 축구 데이터를 분석 중입니다..."):
+        # 응답 생성
+        with st.chat_message("assistant"):
             if is_soccer:
                 system = {
                     "role": "system",
@@ -300,9 +351,9 @@ if prompt := st.chat_input("축구에 대해 물어보세요! 예: '맨유 vs 
                         "필요한 경우 예상 라인업이나 전술도 제안하세요. 친근하고 열정적인 톤으로 답변하세요."
                     )
                 }
-                
+            
                 # 경기 요약 패턴 처리
-                match_pattern = re.search(r"경기 요약[:：]?\s*(.+?)\s+vs\s+(.+)", prompt, re.IGNORECASE)
+                match_pattern = _MATCH_RE.search(prompt)
                 if match_pattern:
                     home, away = match_pattern.group(1).strip(), match_pattern.group(2).strip()
                     tool_out = get_match_summary(home, away)
@@ -311,10 +362,10 @@ if prompt := st.chat_input("축구에 대해 물어보세요! 예: '맨유 vs 
                         {"role": "user", "content": prompt},
                         {"role": "tool", "name": "get_match_summary", "content": tool_out}
                     ]
-                    assistant_reply = call_model(messages, temperature=temp, max_tokens=max_tokens)
+                    assistant_reply = generate_reply(messages, temp, max_tokens)
                 else:
                     # 선수 통계 패턴 처리
-                    player_pattern = re.search(r"선수 통계[:：]?\s*(.+)", prompt, re.IGNORECASE)
+                    player_pattern = _PLAYER_RE.search(prompt)
                     if player_pattern:
                         player = player_pattern.group(1).strip()
                         tool_out = get_player_stats(player)
@@ -323,23 +374,21 @@ if prompt := st.chat_input("축구에 대해 물어보세요! 예: '맨유 vs 
                             {"role": "user", "content": prompt},
                             {"role": "tool", "name": "get_player_stats", "content": tool_out}
                         ]
-                        assistant_reply = call_model(messages, temperature=temp, max_tokens=max_tokens)
+                        assistant_reply = generate_reply(messages, temp, max_tokens)
                     else:
                         # 일반 축구 질문
                         messages = [system, {"role": "user", "content": prompt}]
-                        assistant_reply = call_model(messages, temperature=temp, max_tokens=max_tokens)
+                        assistant_reply = generate_reply(messages, temp, max_tokens)
             else:
-                # 일반 모드
-                messages = [
-                    {"role": m["role"], "content": m["content"]}
-                    for m in st.session_state.messages
-                ]
-                assistant_reply = call_model(messages, temperature=temp, max_tokens=max_tokens)
-        
-        st.markdown(assistant_reply)
+                # 일반 모드 (최근 MAX_TURNS개 메시지만 전송)
+                history = st.session_state.messages
+                messages = list(islice(history, max(len(history) - MAX_TURNS, 0), None))
+                assistant_reply = generate_reply(messages, temp, max_tokens)
     
-    # 어시스턴트 응답 저장
-    st.session_state.messages.append({"role": "assistant", "content": assistant_reply})
+        # 어시스턴트 응답 저장
+        st.session_state.messages.append({"role": "assistant", "content": assistant_reply})
+
+chat_panel(mode, temp, max_tokens)
 
 # 하단 안내
 st.markdown("---")